@@ -1,17 +1,140 @@
 import json
 import os
+import base64
+import urllib.request
+from datetime import datetime
+from io import BytesIO
 import psycopg2
-from typing import Dict, Any
+from PIL import Image
+from typing import Dict, Any, Optional, Tuple
+
+PHOTO_COLUMNS = 'id, url, thumbnail_url, cdn_full_url, cdn_thumbnail_url, alt, display_order, captured_at, camera_model, orientation'
+ADMIN_PHOTO_COLUMNS = 'id, SUBSTRING(url, 1, 100) as url_preview, thumbnail_url, cdn_full_url, cdn_thumbnail_url, alt, display_order, captured_at, camera_model, orientation, LENGTH(url) as size'
+
+EXIF_HEAD_BYTES = 64 * 1024
+EXIF_MAX_ATTEMPTS = 3
+EXIF_IFD = 0x8769
+EXIF_DATETIME_ORIGINAL = 36867
+EXIF_DATETIME = 306
+EXIF_MODEL = 272
+EXIF_ORIENTATION = 274
 
 def get_db_connection():
     '''Get database connection using DATABASE_URL secret'''
     database_url = os.environ.get('DATABASE_URL')
     return psycopg2.connect(database_url)
 
+def photo_from_row(row) -> Dict[str, Any]:
+    '''Map a PHOTO_COLUMNS / ADMIN_PHOTO_COLUMNS row to API dict'''
+    photo = {
+        'id': row[0], 'url': row[1], 'thumbnail_url': row[2], 'cdn_full_url': row[3], 'cdn_thumbnail_url': row[4],
+        'alt': row[5], 'display_order': row[6], 'captured_at': row[7].isoformat() if row[7] else None,
+        'camera_model': row[8], 'orientation': row[9]
+    }
+    if len(row) > 10:
+        photo['size'] = row[10]
+    return photo
+
+def find_exif_segment(image_bytes: bytes) -> Optional[bytes]:
+    '''Locate the JPEG APP1 Exif segment so a truncated file head is enough'''
+    if not image_bytes.startswith(b'\xff\xd8'):
+        return None
+    offset = 2
+    while offset + 4 <= len(image_bytes) and image_bytes[offset] == 0xFF:
+        marker = image_bytes[offset + 1]
+        length = int.from_bytes(image_bytes[offset + 2:offset + 4], 'big')
+        if marker == 0xDA:
+            break
+        if marker == 0xE1 and image_bytes[offset + 4:offset + 10] == b'Exif\x00\x00':
+            return image_bytes[offset + 4:offset + 2 + length]
+        offset += 2 + length
+    return None
+
+def extract_exif(image_bytes: bytes) -> Dict[str, Any]:
+    '''Read capture time, camera model and orientation from image EXIF'''
+    segment = find_exif_segment(image_bytes)
+    if segment:
+        exif = Image.Exif()
+        exif.load(segment)
+    else:
+        exif = Image.open(BytesIO(image_bytes)).getexif()
+    raw_time = exif.get_ifd(EXIF_IFD).get(EXIF_DATETIME_ORIGINAL) or exif.get(EXIF_DATETIME)
+    captured_at = None
+    if raw_time:
+        try:
+            captured_at = datetime.strptime(str(raw_time).strip('\x00 '), '%Y:%m:%d %H:%M:%S')
+        except ValueError:
+            captured_at = None
+    model = str(exif.get(EXIF_MODEL) or '').strip('\x00 ')
+    orientation = exif.get(EXIF_ORIENTATION)
+    return {
+        'captured_at': captured_at,
+        'camera_model': model or None,
+        'orientation': int(orientation) if orientation else None
+    }
+
+def exif_literals(exif: Dict[str, Any]) -> Tuple[str, str, str]:
+    '''Render EXIF values as typed SQL literals: captured_at, camera_model, orientation'''
+    captured_at = f"'{exif['captured_at'].isoformat()}'::timestamp" if exif['captured_at'] else 'NULL::timestamp'
+    camera_model = "'" + str(exif['camera_model']).replace("'", "''") + "'::text" if exif['camera_model'] else 'NULL::text'
+    orientation = f"{int(exif['orientation'])}::smallint" if exif['orientation'] else 'NULL::smallint'
+    return captured_at, camera_model, orientation
+
+def exif_sql(exif: Dict[str, Any]) -> str:
+    '''Render EXIF values as a comma-separated SQL literal list'''
+    return ', '.join(exif_literals(exif))
+
+def parse_timestamp(value: Any, name: str) -> datetime:
+    '''Parse an ISO timestamp from client input; raises ValueError with a client-facing message'''
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{name} must be an ISO timestamp like 2024-06-15T14:00:00')
+
+def parse_exif_fields(body_data: Dict[str, Any]) -> Dict[str, Any]:
+    '''Validate client-supplied captured_at / camera_model / orientation; raises ValueError'''
+    fields = {}
+    if body_data.get('captured_at') is not None:
+        fields['captured_at'] = parse_timestamp(body_data['captured_at'], 'captured_at')
+    camera_model = body_data.get('camera_model')
+    if camera_model is not None:
+        if not isinstance(camera_model, str) or len(camera_model) > 255:
+            raise ValueError('camera_model must be a string up to 255 characters')
+        fields['camera_model'] = camera_model or None
+    orientation = body_data.get('orientation')
+    if orientation is not None:
+        if not isinstance(orientation, int) or isinstance(orientation, bool) or not 1 <= orientation <= 8:
+            raise ValueError('orientation must be an integer between 1 and 8')
+        fields['orientation'] = orientation
+    return fields
+
+def load_image_head(url: Optional[str]) -> Optional[bytes]:
+    '''Get the first EXIF_HEAD_BYTES of an image from a data URL (possibly truncated) or CDN URL'''
+    if not url:
+        return None
+    if url.startswith('data:image'):
+        encoded = url.split(',', 1)[1][:EXIF_HEAD_BYTES * 4 // 3]
+        return base64.b64decode(encoded[:len(encoded) - len(encoded) % 4])
+    if url.startswith('http'):
+        request = urllib.request.Request(url, headers={'Range': f'bytes=0-{EXIF_HEAD_BYTES - 1}'})
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.read(EXIF_HEAD_BYTES)
+    return None
+
+def get_current_revision(cur) -> int:
+    '''Latest change revision covering both live photos and deletions'''
+    cur.execute("""
+        SELECT GREATEST(
+            (SELECT COALESCE(MAX(revision), 0) FROM wedding_photos),
+            (SELECT COALESCE(MAX(revision), 0) FROM wedding_deletions WHERE entity = 'photo')
+        )
+    """)
+    return cur.fetchone()[0]
+
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
-    Business: Manage wedding photos - get list, add, delete, reorder
-    Args: event with httpMethod (GET/POST/DELETE/PUT), body for POST/PUT
+    Business: Manage wedding photos - get list (by capture time range, delta since revision), add, delete, reorder, EXIF backfill
+    Args: event with httpMethod (GET/POST/DELETE/PUT), body for POST/PUT, optional ?since=<rev>&order=captured_at&from=&to= for GET
     Returns: JSON response with photos list or operation status (v2 with CORS fix)
     '''
     method: str = event.get('httpMethod', 'GET')
@@ -39,12 +162,21 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             params = event.get('queryStringParameters') or {}
             admin_mode = params.get('admin') == 'true'
             photo_id = params.get('id')
+            since = params.get('since')
+            
+            if since is not None and not since.isdigit():
+                return {
+                    'statusCode': 400,
+                    'headers': headers,
+                    'body': json.dumps({'error': 'since must be a non-negative integer revision'}),
+                    'isBase64Encoded': False
+                }
             
             if photo_id:
-                cur.execute(f'SELECT id, url, thumbnail_url, cdn_full_url, cdn_thumbnail_url, alt, display_order FROM wedding_photos WHERE id = {int(photo_id)}')
+                cur.execute(f'SELECT {PHOTO_COLUMNS} FROM wedding_photos WHERE id = {int(photo_id)}')
                 row = cur.fetchone()
                 if row:
-                    photo = {'id': row[0], 'url': row[1], 'thumbnail_url': row[2], 'cdn_full_url': row[3], 'cdn_thumbnail_url': row[4], 'alt': row[5], 'display_order': row[6]}
+                    photo = photo_from_row(row)
                     return {
                         'statusCode': 200,
                         'headers': headers,
@@ -59,40 +191,109 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         'isBase64Encoded': False
                     }
             
-            if admin_mode:
-                cur.execute('SELECT id, SUBSTRING(url, 1, 100) as url_preview, thumbnail_url, cdn_full_url, cdn_thumbnail_url, alt, display_order, LENGTH(url) as size FROM wedding_photos ORDER BY display_order ASC')
-                rows = cur.fetchall()
-                photos = [
-                    {'id': row[0], 'url': row[1], 'thumbnail_url': row[2], 'cdn_full_url': row[3], 'cdn_thumbnail_url': row[4], 'alt': row[5], 'display_order': row[6], 'size': row[7]}
-                    for row in rows
-                ]
+            revision = get_current_revision(cur)
+            columns = ADMIN_PHOTO_COLUMNS if admin_mode else PHOTO_COLUMNS
+            conditions = []
+            
+            captured_from = params.get('from')
+            captured_to = params.get('to')
+            if since is not None and (captured_from or captured_to):
+                return {
+                    'statusCode': 400,
+                    'headers': headers,
+                    'body': json.dumps({'error': 'since cannot be combined with from/to, sync the full album instead'}),
+                    'isBase64Encoded': False
+                }
+            try:
+                if captured_from:
+                    conditions.append(f"captured_at >= '{parse_timestamp(captured_from, 'from').isoformat()}'")
+                if captured_to:
+                    conditions.append(f"captured_at < '{parse_timestamp(captured_to, 'to').isoformat()}'")
+            except ValueError as e:
+                return {
+                    'statusCode': 400,
+                    'headers': headers,
+                    'body': json.dumps({'error': str(e)}),
+                    'isBase64Encoded': False
+                }
+            
+            if params.get('order') == 'captured_at' or captured_from or captured_to:
+                order_by = 'captured_at ASC, display_order ASC'
             else:
-                cur.execute('SELECT id, url, thumbnail_url, cdn_full_url, cdn_thumbnail_url, alt, display_order FROM wedding_photos ORDER BY display_order ASC')
-                rows = cur.fetchall()
-                photos = [
-                    {'id': row[0], 'url': row[1], 'thumbnail_url': row[2], 'cdn_full_url': row[3], 'cdn_thumbnail_url': row[4], 'alt': row[5], 'display_order': row[6]}
-                    for row in rows
-                ]
+                order_by = 'display_order ASC'
+            
+            if since is not None:
+                since_rev = int(since)
+                if since_rev > revision:
+                    return {
+                        'statusCode': 410,
+                        'headers': headers,
+                        'body': json.dumps({'error': 'Revision is ahead of server, full refetch required', 'reset': True, 'revision': revision}),
+                        'isBase64Encoded': False
+                    }
+                conditions.append(f'revision > {since_rev} AND revision <= {revision}')
+                where = ' AND '.join(conditions)
+                cur.execute(f'SELECT {columns} FROM wedding_photos WHERE {where} ORDER BY revision ASC')
+                photos = [photo_from_row(row) for row in cur.fetchall()]
+                
+                cur.execute(f"SELECT entity_id FROM wedding_deletions WHERE entity = 'photo' AND revision > {since_rev} AND revision <= {revision} ORDER BY revision ASC")
+                deleted = [row[0] for row in cur.fetchall()]
+                
+                return {
+                    'statusCode': 200,
+                    'headers': headers,
+                    'body': json.dumps({'photos': photos, 'deleted': deleted, 'revision': revision}),
+                    'isBase64Encoded': False
+                }
+            
+            where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+            cur.execute(f'SELECT {columns} FROM wedding_photos {where} ORDER BY {order_by}')
+            photos = [photo_from_row(row) for row in cur.fetchall()]
             
             return {
                 'statusCode': 200,
                 'headers': headers,
-                'body': json.dumps({'photos': photos}),
+                'body': json.dumps({'photos': photos, 'revision': revision}),
                 'isBase64Encoded': False
             }
         
         elif method == 'POST':
             body_data = json.loads(event.get('body', '{}'))
-            url = body_data.get('url', '').replace("'", "''")
+            raw_url = body_data.get('url', '')
+            url = raw_url.replace("'", "''")
             thumbnail_url = body_data.get('thumbnail_url', url).replace("'", "''")
             alt = body_data.get('alt', 'Свадебное фото').replace("'", "''")
             
+            try:
+                client_exif = parse_exif_fields(body_data)
+            except ValueError as e:
+                return {
+                    'statusCode': 400,
+                    'headers': headers,
+                    'body': json.dumps({'error': str(e)}),
+                    'isBase64Encoded': False
+                }
+            
+            exif = {'captured_at': None, 'camera_model': None, 'orientation': None}
+            exif_scanned = False
+            if raw_url.startswith('data:image'):
+                try:
+                    exif = extract_exif(load_image_head(raw_url))
+                    exif_scanned = True
+                except Exception as e:
+                    print(f'Failed to read EXIF for new photo: {e}')
+            # The admin uploader re-encodes through canvas, which strips EXIF, so it sends
+            # metadata read from the original file alongside the image
+            exif.update(client_exif)
+            if client_exif.get('captured_at'):
+                exif_scanned = True
+            
             cur.execute('SELECT COALESCE(MAX(display_order), 0) + 1 FROM wedding_photos')
             next_order = cur.fetchone()[0]
             
             cur.execute(f"""
-                INSERT INTO wedding_photos (url, thumbnail_url, alt, display_order) 
-                VALUES ('{url}', '{thumbnail_url}', '{alt}', {next_order}) 
+                INSERT INTO wedding_photos (url, thumbnail_url, alt, display_order, captured_at, camera_model, orientation, exif_scanned) 
+                VALUES ('{url}', '{thumbnail_url}', '{alt}', {next_order}, {exif_sql(exif)}, {exif_scanned}) 
                 RETURNING id
             """)
             new_id = cur.fetchone()[0]
@@ -129,15 +330,92 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         
         elif method == 'PUT':
             body_data = json.loads(event.get('body', '{}'))
+            action = body_data.get('action')
+            
+            if action == 'sort_by_capture_time':
+                cur.execute("""
+                    UPDATE wedding_photos p 
+                    SET display_order = s.new_order 
+                    FROM (
+                        SELECT id, ROW_NUMBER() OVER (ORDER BY captured_at ASC NULLS LAST, display_order ASC, id ASC) AS new_order 
+                        FROM wedding_photos
+                    ) s 
+                    WHERE p.id = s.id AND p.display_order <> s.new_order
+                """)
+                updated = cur.rowcount
+                conn.commit()
+                
+                return {
+                    'statusCode': 200,
+                    'headers': headers,
+                    'body': json.dumps({'message': 'Photos sorted by capture time', 'updated': updated}),
+                    'isBase64Encoded': False
+                }
+            
+            if action == 'backfill_exif':
+                try:
+                    limit = max(1, min(int(body_data.get('limit', 5)), 20))
+                except (TypeError, ValueError):
+                    return {
+                        'statusCode': 400,
+                        'headers': headers,
+                        'body': json.dumps({'error': 'limit must be an integer'}),
+                        'isBase64Encoded': False
+                    }
+                
+                pending = f'NOT exif_scanned AND exif_attempts < {EXIF_MAX_ATTEMPTS}'
+                cur.execute(f'SELECT id, SUBSTRING(url, 1, {EXIF_HEAD_BYTES * 2}), cdn_full_url FROM wedding_photos WHERE {pending} ORDER BY exif_attempts, id LIMIT {limit}')
+                rows = cur.fetchall()
+                failed = 0
+                
+                for photo_id, url_head, cdn_full_url in rows:
+                    exif = {'captured_at': None, 'camera_model': None, 'orientation': None}
+                    try:
+                        image_bytes = load_image_head(url_head if url_head.startswith(('data:image', 'http')) else cdn_full_url)
+                        if image_bytes:
+                            exif = extract_exif(image_bytes)
+                    except Exception as e:
+                        # Transient failures are retried on later batches, up to EXIF_MAX_ATTEMPTS
+                        print(f'Failed to read EXIF for photo {photo_id}: {e}')
+                        cur.execute(f'UPDATE wedding_photos SET exif_attempts = exif_attempts + 1 WHERE id = {photo_id}')
+                        conn.commit()
+                        failed += 1
+                        continue
+                    
+                    captured_at, camera_model, orientation = exif_literals(exif)
+                    cur.execute(f"""
+                        UPDATE wedding_photos 
+                        SET captured_at = COALESCE(captured_at, {captured_at}), 
+                            camera_model = COALESCE(camera_model, {camera_model}), 
+                            orientation = COALESCE(orientation, {orientation}), 
+                            exif_scanned = TRUE 
+                        WHERE id = {photo_id}
+                    """)
+                    conn.commit()
+                
+                cur.execute(f'SELECT COUNT(*) FROM wedding_photos WHERE {pending}')
+                remaining = cur.fetchone()[0]
+                conn.commit()
+                
+                return {
+                    'statusCode': 200,
+                    'headers': headers,
+                    'body': json.dumps({'processed': len(rows) - failed, 'failed': failed, 'remaining': remaining}),
+                    'isBase64Encoded': False
+                }
+            
             photo_orders = body_data.get('orders', [])
             
-            for item in photo_orders:
-                photo_id = int(item.get('id'))
-                new_order = int(item.get('display_order'))
+            if photo_orders:
+                values = ', '.join(
+                    f"({int(item.get('id'))}, {int(item.get('display_order'))})"
+                    for item in photo_orders
+                )
                 cur.execute(f"""
-                    UPDATE wedding_photos 
-                    SET display_order = {new_order} 
-                    WHERE id = {photo_id}
+                    UPDATE wedding_photos p 
+                    SET display_order = v.display_order 
+                    FROM (VALUES {values}) AS v(id, display_order) 
+                    WHERE p.id = v.id
                 """)
             
             conn.commit()
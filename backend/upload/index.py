@@ -1,91 +1,462 @@
 import json
 import base64
+import hashlib
 import uuid
 import os
-from typing import Dict, Any
+import psycopg2
+import boto3
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+CHUNK_SIZE = 2 * 1024 * 1024
+# complete copies every staged chunk into object storage in a single invocation,
+# so the cap is what it can stream before the function timeout
+MAX_UPLOAD_SIZE = 100 * 1024 * 1024
+# S3 multipart parts must be at least 5 MB (except the last); staged chunks are
+# regrouped into parts of this size, which also bounds memory during complete
+S3_PART_SIZE = 4 * CHUNK_SIZE
+MAX_THUMBNAIL_LENGTH = 300000
+SESSION_TTL = '24 hours'
+S3_BUCKET = 'files'
+
+def get_db_connection():
+    '''Get database connection using DATABASE_URL secret'''
+    database_url = os.environ.get('DATABASE_URL')
+    return psycopg2.connect(database_url)
+
+def detect_extension(image_bytes: bytes) -> str:
+    '''Guess file extension from image magic bytes'''
+    if image_bytes.startswith(b'\x89PNG'):
+        return 'png'
+    return 'jpg'
+
+def detect_mime_type(image_bytes: bytes) -> str:
+    '''Guess image MIME type from magic bytes'''
+    return 'image/png' if detect_extension(image_bytes) == 'png' else 'image/jpeg'
+
+def sweep_expired_sessions(cur) -> None:
+    '''Drop upload sessions older than SESSION_TTL; their chunks cascade'''
+    cur.execute(f"DELETE FROM upload_sessions WHERE created_at < NOW() - INTERVAL '{SESSION_TTL}'")
+
+def get_s3_client():
+    '''Get object storage client using AWS_ACCESS_KEY_ID / AWS_SECRET_ACCESS_KEY secrets'''
+    return boto3.client(
+        's3',
+        endpoint_url='https://bucket.poehali.dev',
+        aws_access_key_id=os.environ.get('AWS_ACCESS_KEY_ID'),
+        aws_secret_access_key=os.environ.get('AWS_SECRET_ACCESS_KEY')
+    )
+
+def cdn_url_for(key: str) -> str:
+    '''Public CDN URL of an object in S3_BUCKET'''
+    return f"https://cdn.poehali.dev/projects/{os.environ.get('AWS_ACCESS_KEY_ID')}/bucket/{key}"
+
+def store_image(image_bytes: bytes) -> Dict[str, str]:
+    '''Put decoded image into object storage and return its CDN location'''
+    file_extension = detect_extension(image_bytes)
+    filename = f"{uuid.uuid4()}.{file_extension}"
+    key = f'wedding/{filename}'
+    get_s3_client().put_object(Bucket=S3_BUCKET, Key=key, Body=image_bytes, ContentType=detect_mime_type(image_bytes))
+    return {'url': cdn_url_for(key), 'filename': filename}
+
+def read_raw_body(event: Dict[str, Any]) -> bytes:
+    '''Return request body as raw bytes (binary bodies arrive base64-encoded); ValueError if malformed'''
+    body = event.get('body') or ''
+    if event.get('isBase64Encoded'):
+        return base64.b64decode(body, validate=True)
+    return body.encode('latin-1')
+
+def parse_init_body(body_data: Any) -> Dict[str, Any]:
+    '''Validate chunked upload init request; raises ValueError with a client-facing message'''
+    if not isinstance(body_data, dict):
+        raise ValueError('JSON object body required')
+
+    total_size = body_data.get('size')
+    if not isinstance(total_size, int) or isinstance(total_size, bool) or not 0 < total_size <= MAX_UPLOAD_SIZE:
+        raise ValueError(f'size must be an integer between 1 and {MAX_UPLOAD_SIZE}')
+
+    sha256 = body_data.get('sha256')
+    if not isinstance(sha256, str) or len(sha256) != 64 or any(c not in '0123456789abcdef' for c in sha256.lower()):
+        raise ValueError('sha256 must be a 64-character hex digest')
+
+    thumbnail = body_data.get('thumbnail')
+    if not isinstance(thumbnail, str) or not thumbnail.startswith('data:image') or len(thumbnail) > MAX_THUMBNAIL_LENGTH:
+        raise ValueError(f'thumbnail must be an image data URL up to {MAX_THUMBNAIL_LENGTH} characters')
+
+    captured_at = body_data.get('captured_at')
+    if captured_at is not None:
+        try:
+            captured_at = datetime.fromisoformat(captured_at)
+        except (TypeError, ValueError):
+            raise ValueError('captured_at must be an ISO timestamp like 2024-06-15T14:00:00')
+
+    camera_model = body_data.get('camera_model')
+    if camera_model is not None and not isinstance(camera_model, str):
+        raise ValueError('camera_model must be a string')
+
+    orientation = body_data.get('orientation')
+    if orientation is not None and (not isinstance(orientation, int) or not 1 <= orientation <= 8):
+        raise ValueError('orientation must be an integer between 1 and 8')
+
+    filename = body_data.get('filename') or ''
+    alt = body_data.get('alt') or 'Свадебное фото'
+    if not isinstance(filename, str) or not isinstance(alt, str):
+        raise ValueError('filename and alt must be strings')
+
+    return {
+        'filename': filename,
+        'alt': alt,
+        'size': total_size,
+        'sha256': sha256.lower(),
+        'thumbnail': thumbnail,
+        'captured_at': captured_at,
+        'camera_model': camera_model or None,
+        'orientation': orientation
+    }
+
+def get_session_status(cur, upload_id: str, for_update: bool = False) -> Optional[Dict[str, Any]]:
+    '''Describe upload session progress, or None if it does not exist; optionally lock the session row'''
+    lock = ' FOR UPDATE' if for_update else ''
+    cur.execute(
+        f"SELECT filename, total_size, sha256, status, photo_id, alt, captured_at, camera_model, orientation FROM upload_sessions WHERE id = %s AND created_at >= NOW() - INTERVAL '{SESSION_TTL}'{lock}",
+        (upload_id,)
+    )
+    row = cur.fetchone()
+    if not row:
+        return None
+
+    cur.execute(
+        'SELECT chunk_offset, LENGTH(data) FROM upload_chunks WHERE upload_id = %s ORDER BY chunk_offset',
+        (upload_id,)
+    )
+    next_offset = 0
+    received = 0
+    for chunk_offset, length in cur.fetchall():
+        received += length
+        if chunk_offset == next_offset:
+            next_offset += length
+
+    return {
+        'upload_id': upload_id,
+        'filename': row[0],
+        'size': row[1],
+        'sha256': row[2],
+        'status': row[3],
+        'photo_id': row[4],
+        'alt': row[5],
+        'captured_at': row[6].isoformat() if row[6] else None,
+        'camera_model': row[7],
+        'orientation': row[8],
+        'received': received,
+        'next_offset': next_offset,
+        'chunk_size': CHUNK_SIZE
+    }
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
-    Business: Upload photo and return CDN URL
-    Args: event with httpMethod (POST), body with base64 image
-    Returns: JSON with uploaded photo URL
+    Business: Upload photo and return CDN URL, either in one request or via chunked resumable protocol
+    Args: event with httpMethod (POST/PUT/GET); POST body with base64 image, or
+          POST ?action=init / PUT ?upload_id=&offset= with raw chunk / GET ?upload_id= / POST ?action=complete&upload_id=
+    Returns: JSON with uploaded photo URL, chunked upload status, or new photo id and CDN URL on completion
     '''
     method: str = event.get('httpMethod', 'POST')
-    
+
+    headers = {
+        'Content-Type': 'application/json',
+        'Access-Control-Allow-Origin': '*'
+    }
+
     if method == 'OPTIONS':
         return {
             'statusCode': 200,
             'headers': {
                 'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'POST, OPTIONS',
+                'Access-Control-Allow-Methods': 'GET, POST, PUT, OPTIONS',
                 'Access-Control-Allow-Headers': 'Content-Type',
                 'Access-Control-Max-Age': '86400'
             },
             'body': '',
             'isBase64Encoded': False
         }
-    
-    if method != 'POST':
+
+    params = event.get('queryStringParameters') or {}
+    action = params.get('action')
+    upload_id = params.get('upload_id')
+
+    if method == 'POST' and not action:
+        return upload_single(event, headers)
+
+    if method not in ('GET', 'POST', 'PUT'):
         return {
             'statusCode': 405,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
+            'headers': headers,
             'body': json.dumps({'error': 'Method not allowed'}),
             'isBase64Encoded': False
         }
-    
+
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+
+        if method == 'POST' and action == 'init':
+            try:
+                fields = parse_init_body(json.loads(event.get('body') or '{}'))
+            except ValueError as e:
+                return {
+                    'statusCode': 400,
+                    'headers': headers,
+                    'body': json.dumps({'error': str(e)}),
+                    'isBase64Encoded': False
+                }
+
+            sweep_expired_sessions(cur)
+            new_id = str(uuid.uuid4())
+            cur.execute(
+                '''
+                INSERT INTO upload_sessions (id, filename, alt, total_size, sha256, thumbnail_url, captured_at, camera_model, orientation)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                ''',
+                (new_id, fields['filename'], fields['alt'], fields['size'], fields['sha256'], fields['thumbnail'],
+                 fields['captured_at'], fields['camera_model'], fields['orientation'])
+            )
+            conn.commit()
+
+            return {
+                'statusCode': 201,
+                'headers': headers,
+                'body': json.dumps({'upload_id': new_id, 'chunk_size': CHUNK_SIZE, 'next_offset': 0}),
+                'isBase64Encoded': False
+            }
+
+        if not upload_id:
+            return {
+                'statusCode': 400,
+                'headers': headers,
+                'body': json.dumps({'error': 'upload_id required'}),
+                'isBase64Encoded': False
+            }
+
+        if method == 'PUT':
+            offset_param = params.get('offset') or ''
+            try:
+                chunk = read_raw_body(event)
+            except ValueError:
+                chunk = None
+            if not (offset_param.isascii() and offset_param.isdigit()) or not chunk:
+                return {
+                    'statusCode': 400,
+                    'headers': headers,
+                    'body': json.dumps({'error': 'Numeric offset and binary chunk body required'}),
+                    'isBase64Encoded': False
+                }
+
+        # PUT and complete lock the session row so a chunk cannot change while complete
+        # verifies and copies it, and two concurrent completes cannot both insert a photo
+        status = get_session_status(cur, upload_id, for_update=method != 'GET')
+        if not status:
+            return {
+                'statusCode': 404,
+                'headers': headers,
+                'body': json.dumps({'error': 'Upload not found'}),
+                'isBase64Encoded': False
+            }
+
+        if method == 'GET':
+            return {
+                'statusCode': 200,
+                'headers': headers,
+                'body': json.dumps(status),
+                'isBase64Encoded': False
+            }
+
+        if status['status'] != 'pending':
+            return {
+                'statusCode': 409,
+                'headers': headers,
+                'body': json.dumps({'error': 'Upload already completed', 'id': status['photo_id']}),
+                'isBase64Encoded': False
+            }
+
+        if method == 'PUT':
+            chunk_offset = int(offset_param)
+            is_last_chunk = chunk_offset + len(chunk) == status['size']
+            if (chunk_offset % CHUNK_SIZE != 0
+                    or chunk_offset + len(chunk) > status['size']
+                    or (len(chunk) != CHUNK_SIZE and not is_last_chunk)):
+                return {
+                    'statusCode': 400,
+                    'headers': headers,
+                    'body': json.dumps({'error': 'Invalid chunk offset or length'}),
+                    'isBase64Encoded': False
+                }
+
+            cur.execute(
+                '''
+                INSERT INTO upload_chunks (upload_id, chunk_offset, data) VALUES (%s, %s, %s)
+                ON CONFLICT (upload_id, chunk_offset) DO UPDATE SET data = EXCLUDED.data
+                ''',
+                (upload_id, chunk_offset, psycopg2.Binary(chunk))
+            )
+            conn.commit()
+
+            return {
+                'statusCode': 200,
+                'headers': headers,
+                'body': json.dumps(get_session_status(cur, upload_id)),
+                'isBase64Encoded': False
+            }
+
+        if method == 'POST' and action == 'complete':
+            if status['next_offset'] != status['size'] or status['received'] != status['size']:
+                return {
+                    'statusCode': 409,
+                    'headers': headers,
+                    'body': json.dumps({'error': 'Upload incomplete', **status}),
+                    'isBase64Encoded': False
+                }
+
+            # Stream chunks one at a time through a server-side cursor, hashing them and
+            # regrouping them into S3 multipart parts, so memory stays at about one part
+            s3 = get_s3_client()
+            digest = hashlib.sha256()
+            key = None
+            multipart_id = None
+            parts = []
+            buffer = []
+            buffered = 0
+
+            def flush_part():
+                body = b''.join(buffer)
+                response = s3.upload_part(Bucket=S3_BUCKET, Key=key, UploadId=multipart_id,
+                                          PartNumber=len(parts) + 1, Body=body)
+                parts.append({'PartNumber': len(parts) + 1, 'ETag': response['ETag']})
+                buffer.clear()
+
+            stream = conn.cursor(name=f'upload_{upload_id.replace("-", "")}')
+            try:
+                stream.execute(
+                    'SELECT data FROM upload_chunks WHERE upload_id = %s ORDER BY chunk_offset',
+                    (upload_id,)
+                )
+                while True:
+                    rows = stream.fetchmany(1)
+                    if not rows:
+                        break
+                    part = bytes(rows[0][0])
+                    if key is None:
+                        key = f'wedding/originals/{uuid.uuid4()}.{detect_extension(part)}'
+                        multipart_id = s3.create_multipart_upload(
+                            Bucket=S3_BUCKET, Key=key, ContentType=detect_mime_type(part)
+                        )['UploadId']
+                    digest.update(part)
+                    buffer.append(part)
+                    buffered += len(part)
+                    if buffered >= S3_PART_SIZE:
+                        flush_part()
+                        buffered = 0
+                stream.close()
+
+                if digest.hexdigest() != status['sha256']:
+                    s3.abort_multipart_upload(Bucket=S3_BUCKET, Key=key, UploadId=multipart_id)
+                    cur.execute('DELETE FROM upload_chunks WHERE upload_id = %s', (upload_id,))
+                    conn.commit()
+                    return {
+                        'statusCode': 422,
+                        'headers': headers,
+                        'body': json.dumps({'error': 'Checksum mismatch, upload restarted'}),
+                        'isBase64Encoded': False
+                    }
+
+                if buffer:
+                    flush_part()
+                s3.complete_multipart_upload(Bucket=S3_BUCKET, Key=key, UploadId=multipart_id,
+                                             MultipartUpload={'Parts': parts})
+            except Exception:
+                if multipart_id:
+                    s3.abort_multipart_upload(Bucket=S3_BUCKET, Key=key, UploadId=multipart_id)
+                raise
+
+            # Only the CDN URL and the small client thumbnail go into the row the list endpoint serves
+            cdn_url = cdn_url_for(key)
+            cur.execute('SELECT COALESCE(MAX(display_order), 0) + 1 FROM wedding_photos')
+            next_order = cur.fetchone()[0]
+            cur.execute(
+                '''
+                INSERT INTO wedding_photos (url, thumbnail_url, cdn_full_url, alt, display_order, captured_at, camera_model, orientation, exif_scanned)
+                SELECT %s, thumbnail_url, %s, alt, %s, captured_at, camera_model, orientation, captured_at IS NOT NULL
+                FROM upload_sessions WHERE id = %s
+                RETURNING id
+                ''',
+                (cdn_url, cdn_url, next_order, upload_id)
+            )
+            photo_id = cur.fetchone()[0]
+
+            cur.execute(
+                "UPDATE upload_sessions SET status = 'completed', photo_id = %s, thumbnail_url = '' WHERE id = %s",
+                (photo_id, upload_id)
+            )
+            cur.execute('DELETE FROM upload_chunks WHERE upload_id = %s', (upload_id,))
+            sweep_expired_sessions(cur)
+            conn.commit()
+
+            return {
+                'statusCode': 201,
+                'headers': headers,
+                'body': json.dumps({'success': True, 'id': photo_id, 'upload_id': upload_id, 'url': cdn_url, 'message': 'Photo added'}),
+                'isBase64Encoded': False
+            }
+
+        return {
+            'statusCode': 400,
+            'headers': headers,
+            'body': json.dumps({'error': 'Unknown action'}),
+            'isBase64Encoded': False
+        }
+
+    except Exception as e:
+        return {
+            'statusCode': 500,
+            'headers': headers,
+            'body': json.dumps({'error': str(e)}),
+            'isBase64Encoded': False
+        }
+
+    finally:
+        if 'cur' in locals():
+            cur.close()
+        if 'conn' in locals():
+            conn.close()
+
+def upload_single(event: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+    '''Single-request upload with the whole image as base64 in JSON body'''
     body_data = json.loads(event.get('body', '{}'))
     image_data = body_data.get('image', '')
-    
+
     if not image_data:
         return {
             'statusCode': 400,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
+            'headers': headers,
             'body': json.dumps({'error': 'Image data required'}),
             'isBase64Encoded': False
         }
-    
+
     if ',' in image_data:
         image_data = image_data.split(',')[1]
-    
+
     try:
         image_bytes = base64.b64decode(image_data)
-        file_extension = 'jpg'
-        
-        if image_data.startswith('iVBOR'):
-            file_extension = 'png'
-        elif image_data.startswith('/9j/'):
-            file_extension = 'jpg'
-        
-        filename = f"{uuid.uuid4()}.{file_extension}"
-        
-        cdn_url = f"https://cdn.poehali.dev/projects/b3d2a9e2-198b-4e75-821e-efa9e6d0a5ee/files/{filename}"
-        
+
         return {
             'statusCode': 200,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({
-                'url': cdn_url,
-                'filename': filename
-            }),
+            'headers': headers,
+            'body': json.dumps(store_image(image_bytes)),
             'isBase64Encoded': False
         }
-    
+
     except Exception as e:
         return {
             'statusCode': 500,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
+            'headers': headers,
             'body': json.dumps({'error': str(e)}),
             'isBase64Encoded': False
         }
@@ -5,8 +5,8 @@ from typing import Dict, Any
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
-    Business: Manage wedding videos - get list and update video URLs
-    Args: event with httpMethod (GET/PUT/OPTIONS), body for PUT requests
+    Business: Manage wedding videos - get list (or delta since revision) and update video URLs
+    Args: event with httpMethod (GET/PUT/OPTIONS), body for PUT requests, optional ?since=<rev> for GET
     Returns: JSON with videos list or update confirmation (v2 with CORS fix)
     '''
     method: str = event.get('httpMethod', 'GET')
@@ -32,11 +32,46 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         conn = psycopg2.connect(dsn)
         cursor = conn.cursor()
         if method == 'GET':
+            params = event.get('queryStringParameters') or {}
+            since = params.get('since')
+            
+            if since is not None and not since.isdigit():
+                return {
+                    'statusCode': 400,
+                    'headers': headers,
+                    'body': json.dumps({'error': 'since must be a non-negative integer revision'}),
+                    'isBase64Encoded': False
+                }
+            
             cursor.execute('''
-                SELECT id, title, url, display_order 
-                FROM wedding_videos 
-                ORDER BY display_order
+                SELECT GREATEST(
+                    (SELECT COALESCE(MAX(revision), 0) FROM wedding_videos),
+                    (SELECT COALESCE(MAX(revision), 0) FROM wedding_deletions WHERE entity = 'video')
+                )
             ''')
+            revision = cursor.fetchone()[0]
+            
+            if since is not None:
+                since_rev = int(since)
+                if since_rev > revision:
+                    return {
+                        'statusCode': 410,
+                        'headers': headers,
+                        'body': json.dumps({'error': 'Revision is ahead of server, full refetch required', 'reset': True, 'revision': revision}),
+                        'isBase64Encoded': False
+                    }
+                cursor.execute(f'''
+                    SELECT id, title, url, display_order 
+                    FROM wedding_videos 
+                    WHERE revision > {since_rev} AND revision <= {revision}
+                    ORDER BY revision
+                ''')
+            else:
+                cursor.execute('''
+                    SELECT id, title, url, display_order 
+                    FROM wedding_videos 
+                    ORDER BY display_order
+                ''')
             rows = cursor.fetchall()
             
             videos = [
@@ -49,11 +84,27 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 for row in rows
             ]
             
+            if since is not None:
+                cursor.execute(f'''
+                    SELECT entity_id 
+                    FROM wedding_deletions 
+                    WHERE entity = 'video' AND revision > {since_rev} AND revision <= {revision}
+                    ORDER BY revision
+                ''')
+                deleted = [row[0] for row in cursor.fetchall()]
+                
+                return {
+                    'statusCode': 200,
+                    'headers': headers,
+                    'isBase64Encoded': False,
+                    'body': json.dumps({'videos': videos, 'deleted': deleted, 'revision': revision})
+                }
+            
             return {
                 'statusCode': 200,
                 'headers': headers,
                 'isBase64Encoded': False,
-                'body': json.dumps({'videos': videos})
+                'body': json.dumps({'videos': videos, 'revision': revision})
             }
         
         elif method == 'PUT':
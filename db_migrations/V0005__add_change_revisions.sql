@@ -0,0 +1,112 @@
+-- Global revision counter shared by photos and videos for delta sync (?since=<rev>)
+CREATE SEQUENCE IF NOT EXISTS wedding_change_rev_seq;
+
+ALTER TABLE wedding_photos ADD COLUMN IF NOT EXISTS revision BIGINT NOT NULL DEFAULT nextval('wedding_change_rev_seq');
+ALTER TABLE wedding_videos ADD COLUMN IF NOT EXISTS revision BIGINT NOT NULL DEFAULT nextval('wedding_change_rev_seq');
+
+-- The defaults only backfill existing rows; from here on revisions are drawn
+-- exclusively by wedding_next_revision() so nothing bypasses its lock
+ALTER TABLE wedding_photos ALTER COLUMN revision DROP DEFAULT;
+ALTER TABLE wedding_videos ALTER COLUMN revision DROP DEFAULT;
+
+CREATE INDEX IF NOT EXISTS idx_wedding_photos_revision ON wedding_photos(revision);
+CREATE INDEX IF NOT EXISTS idx_wedding_videos_revision ON wedding_videos(revision);
+
+-- Tombstones so clients can learn about deleted rows
+CREATE TABLE IF NOT EXISTS wedding_deletions (
+    entity VARCHAR(16) NOT NULL,
+    entity_id INTEGER NOT NULL,
+    revision BIGINT NOT NULL,
+    deleted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (entity, entity_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_wedding_deletions_revision ON wedding_deletions(entity, revision);
+
+-- Writers take a transaction-scoped lock before drawing a revision, so revisions
+-- become visible in commit order and a reader never sees rev N while N-1 is in flight
+CREATE OR REPLACE FUNCTION wedding_next_revision() RETURNS BIGINT AS $$
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('wedding_change_rev_seq'));
+    RETURN nextval('wedding_change_rev_seq');
+END;
+$$ LANGUAGE plpgsql;
+
+-- New rows get a placeholder; the real revision is assigned by deferred triggers
+-- at commit, so the lock above is held only for the commit itself rather than for
+-- the whole writing transaction. Placeholder rows are never visible to readers.
+CREATE OR REPLACE FUNCTION wedding_placeholder_revision() RETURNS TRIGGER AS $$
+BEGIN
+    NEW.revision := 0;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION wedding_assign_revision() RETURNS TRIGGER AS $$
+BEGIN
+    EXECUTE format('UPDATE %I SET revision = wedding_next_revision() WHERE id = $1', TG_TABLE_NAME)
+    USING NEW.id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION wedding_record_deletion() RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO wedding_deletions (entity, entity_id, revision)
+    VALUES (TG_ARGV[0], OLD.id, wedding_next_revision())
+    ON CONFLICT (entity, entity_id) DO UPDATE
+    SET revision = EXCLUDED.revision, deleted_at = CURRENT_TIMESTAMP;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_wedding_photos_placeholder_rev ON wedding_photos;
+CREATE TRIGGER trg_wedding_photos_placeholder_rev
+    BEFORE INSERT ON wedding_photos
+    FOR EACH ROW EXECUTE FUNCTION wedding_placeholder_revision();
+
+DROP TRIGGER IF EXISTS trg_wedding_photos_insert_rev ON wedding_photos;
+CREATE CONSTRAINT TRIGGER trg_wedding_photos_insert_rev
+    AFTER INSERT ON wedding_photos
+    DEFERRABLE INITIALLY DEFERRED
+    FOR EACH ROW EXECUTE FUNCTION wedding_assign_revision();
+
+-- Only tracked columns bump the revision; the revision write itself does not re-fire this
+DROP TRIGGER IF EXISTS trg_wedding_photos_update_rev ON wedding_photos;
+CREATE CONSTRAINT TRIGGER trg_wedding_photos_update_rev
+    AFTER UPDATE ON wedding_photos
+    DEFERRABLE INITIALLY DEFERRED
+    FOR EACH ROW WHEN ((OLD.url, OLD.thumbnail_url, OLD.cdn_full_url, OLD.cdn_thumbnail_url, OLD.alt, OLD.display_order)
+        IS DISTINCT FROM (NEW.url, NEW.thumbnail_url, NEW.cdn_full_url, NEW.cdn_thumbnail_url, NEW.alt, NEW.display_order))
+    EXECUTE FUNCTION wedding_assign_revision();
+
+DROP TRIGGER IF EXISTS trg_wedding_photos_delete_rev ON wedding_photos;
+CREATE CONSTRAINT TRIGGER trg_wedding_photos_delete_rev
+    AFTER DELETE ON wedding_photos
+    DEFERRABLE INITIALLY DEFERRED
+    FOR EACH ROW EXECUTE FUNCTION wedding_record_deletion('photo');
+
+DROP TRIGGER IF EXISTS trg_wedding_videos_placeholder_rev ON wedding_videos;
+CREATE TRIGGER trg_wedding_videos_placeholder_rev
+    BEFORE INSERT ON wedding_videos
+    FOR EACH ROW EXECUTE FUNCTION wedding_placeholder_revision();
+
+DROP TRIGGER IF EXISTS trg_wedding_videos_insert_rev ON wedding_videos;
+CREATE CONSTRAINT TRIGGER trg_wedding_videos_insert_rev
+    AFTER INSERT ON wedding_videos
+    DEFERRABLE INITIALLY DEFERRED
+    FOR EACH ROW EXECUTE FUNCTION wedding_assign_revision();
+
+DROP TRIGGER IF EXISTS trg_wedding_videos_update_rev ON wedding_videos;
+CREATE CONSTRAINT TRIGGER trg_wedding_videos_update_rev
+    AFTER UPDATE ON wedding_videos
+    DEFERRABLE INITIALLY DEFERRED
+    FOR EACH ROW WHEN ((OLD.title, OLD.url, OLD.display_order)
+        IS DISTINCT FROM (NEW.title, NEW.url, NEW.display_order))
+    EXECUTE FUNCTION wedding_assign_revision();
+
+DROP TRIGGER IF EXISTS trg_wedding_videos_delete_rev ON wedding_videos;
+CREATE CONSTRAINT TRIGGER trg_wedding_videos_delete_rev
+    AFTER DELETE ON wedding_videos
+    DEFERRABLE INITIALLY DEFERRED
+    FOR EACH ROW EXECUTE FUNCTION wedding_record_deletion('video');
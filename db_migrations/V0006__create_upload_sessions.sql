@@ -0,0 +1,22 @@
+-- Staging area for chunked, resumable uploads of large originals
+CREATE TABLE IF NOT EXISTS upload_sessions (
+    id VARCHAR(36) PRIMARY KEY,
+    filename TEXT NOT NULL DEFAULT '',
+    alt TEXT NOT NULL DEFAULT 'Свадебное фото',
+    total_size BIGINT NOT NULL,
+    sha256 VARCHAR(64) NOT NULL,
+    thumbnail_url TEXT NOT NULL DEFAULT '',
+    status VARCHAR(16) NOT NULL DEFAULT 'pending',
+    photo_id INTEGER,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Expired sessions (pending or completed) are swept by created_at
+CREATE INDEX IF NOT EXISTS idx_upload_sessions_created_at ON upload_sessions(created_at);
+
+CREATE TABLE IF NOT EXISTS upload_chunks (
+    upload_id VARCHAR(36) NOT NULL REFERENCES upload_sessions(id) ON DELETE CASCADE,
+    chunk_offset BIGINT NOT NULL,
+    data BYTEA NOT NULL,
+    PRIMARY KEY (upload_id, chunk_offset)
+);
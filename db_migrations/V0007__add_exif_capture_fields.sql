@@ -0,0 +1,28 @@
+-- EXIF metadata for chronological browsing
+ALTER TABLE wedding_photos ADD COLUMN IF NOT EXISTS captured_at TIMESTAMP;
+ALTER TABLE wedding_photos ADD COLUMN IF NOT EXISTS camera_model TEXT;
+ALTER TABLE wedding_photos ADD COLUMN IF NOT EXISTS orientation SMALLINT;
+ALTER TABLE wedding_photos ADD COLUMN IF NOT EXISTS exif_scanned BOOLEAN NOT NULL DEFAULT FALSE;
+ALTER TABLE wedding_photos ADD COLUMN IF NOT EXISTS exif_attempts SMALLINT NOT NULL DEFAULT 0;
+
+-- Serves ORDER BY captured_at, display_order and capture time range filters
+CREATE INDEX IF NOT EXISTS idx_wedding_photos_captured_at ON wedding_photos(captured_at, display_order);
+
+-- Lets the backfill pass find unscanned photos without a full scan
+CREATE INDEX IF NOT EXISTS idx_wedding_photos_exif_pending ON wedding_photos(exif_attempts, id) WHERE NOT exif_scanned;
+
+-- EXIF read client-side from the original file, carried through chunked uploads
+ALTER TABLE upload_sessions ADD COLUMN IF NOT EXISTS captured_at TIMESTAMP;
+ALTER TABLE upload_sessions ADD COLUMN IF NOT EXISTS camera_model TEXT;
+ALTER TABLE upload_sessions ADD COLUMN IF NOT EXISTS orientation SMALLINT;
+
+-- Metadata columns also change what clients render, so they bump the sync revision
+DROP TRIGGER IF EXISTS trg_wedding_photos_update_rev ON wedding_photos;
+CREATE CONSTRAINT TRIGGER trg_wedding_photos_update_rev
+    AFTER UPDATE ON wedding_photos
+    DEFERRABLE INITIALLY DEFERRED
+    FOR EACH ROW WHEN ((OLD.url, OLD.thumbnail_url, OLD.cdn_full_url, OLD.cdn_thumbnail_url, OLD.alt, OLD.display_order,
+                        OLD.captured_at, OLD.camera_model, OLD.orientation)
+        IS DISTINCT FROM (NEW.url, NEW.thumbnail_url, NEW.cdn_full_url, NEW.cdn_thumbnail_url, NEW.alt, NEW.display_order,
+                          NEW.captured_at, NEW.camera_model, NEW.orientation))
+    EXECUTE FUNCTION wedding_assign_revision();
@@ -4,6 +4,7 @@ import { Input } from '@/components/ui/input';
 import { Button } from '@/components/ui/button';
 import Icon from '@/components/ui/icon';
 import { useToast } from '@/hooks/use-toast';
+import { readExif } from '@/utils/exif';
 
 interface PhotoUploadProps {
   onPhotosUploaded: () => void;
@@ -125,13 +126,17 @@ export default function PhotoUpload({ onPhotosUploaded, photosApi }: PhotoUpload
 
         console.log(`Загрузка ${file.name}...`);
         
+        // Canvas re-encoding strips EXIF, so read it from the original file
+        const exif = await readExif(file);
+        
         const response = await fetch(photosApi, {
           method: 'POST',
           headers: { 'Content-Type': 'application/json' },
           body: JSON.stringify({ 
             url: result.full,
             thumbnail_url: result.thumbnail,
-            alt: file.name.replace(/\.[^/.]+$/, '').replace(/_/g, ' ')
+            alt: file.name.replace(/\.[^/.]+$/, '').replace(/_/g, ' '),
+            ...exif
           })
         });
 
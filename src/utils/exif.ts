@@ -0,0 +1,102 @@
+export interface ExifData {
+  captured_at?: string;
+  camera_model?: string;
+  orientation?: number;
+}
+
+const EXIF_HEAD_BYTES = 128 * 1024;
+
+const TAG_MODEL = 0x0110;
+const TAG_ORIENTATION = 0x0112;
+const TAG_DATETIME = 0x0132;
+const TAG_EXIF_IFD = 0x8769;
+const TAG_DATETIME_ORIGINAL = 0x9003;
+
+interface IfdEntry {
+  type: number;
+  count: number;
+  valueOffset: number;
+}
+
+function readIfd(view: DataView, tiffStart: number, ifdOffset: number, little: boolean): Map<number, IfdEntry> {
+  const entries = new Map<number, IfdEntry>();
+  const start = tiffStart + ifdOffset;
+  if (start + 2 > view.byteLength) return entries;
+
+  const count = view.getUint16(start, little);
+  for (let i = 0; i < count; i++) {
+    const entry = start + 2 + i * 12;
+    if (entry + 12 > view.byteLength) break;
+    entries.set(view.getUint16(entry, little), {
+      type: view.getUint16(entry + 2, little),
+      count: view.getUint32(entry + 4, little),
+      valueOffset: entry + 8
+    });
+  }
+  return entries;
+}
+
+function readAscii(view: DataView, tiffStart: number, entry: IfdEntry, little: boolean): string | undefined {
+  if (entry.type !== 2) return undefined;
+  const offset = entry.count > 4 ? tiffStart + view.getUint32(entry.valueOffset, little) : entry.valueOffset;
+  if (offset + entry.count > view.byteLength) return undefined;
+
+  let text = '';
+  for (let i = 0; i < entry.count; i++) {
+    const code = view.getUint8(offset + i);
+    if (code === 0) break;
+    text += String.fromCharCode(code);
+  }
+  return text.trim() || undefined;
+}
+
+function toIsoTimestamp(value: string | undefined): string | undefined {
+  const match = value?.match(/^(\d{4}):(\d{2}):(\d{2}) (\d{2}):(\d{2}):(\d{2})/);
+  if (!match) return undefined;
+  return `${match[1]}-${match[2]}-${match[3]}T${match[4]}:${match[5]}:${match[6]}`;
+}
+
+export async function readExif(file: File): Promise<ExifData> {
+  try {
+    const view = new DataView(await file.slice(0, EXIF_HEAD_BYTES).arrayBuffer());
+    if (view.byteLength < 4 || view.getUint16(0) !== 0xffd8) return {};
+
+    let offset = 2;
+    while (offset + 4 <= view.byteLength) {
+      if (view.getUint8(offset) !== 0xff) break;
+      const marker = view.getUint8(offset + 1);
+      const length = view.getUint16(offset + 2);
+      if (marker === 0xda) break;
+
+      if (marker === 0xe1 && offset + 10 <= view.byteLength && view.getUint32(offset + 4) === 0x45786966) {
+        const tiffStart = offset + 10;
+        const little = view.getUint16(tiffStart) === 0x4949;
+        const ifd0 = readIfd(view, tiffStart, view.getUint32(tiffStart + 4, little), little);
+
+        const exifPointer = ifd0.get(TAG_EXIF_IFD);
+        const exifIfd = exifPointer
+          ? readIfd(view, tiffStart, view.getUint32(exifPointer.valueOffset, little), little)
+          : new Map<number, IfdEntry>();
+
+        const original = exifIfd.get(TAG_DATETIME_ORIGINAL);
+        const fallback = ifd0.get(TAG_DATETIME);
+        const model = ifd0.get(TAG_MODEL);
+        const orientation = ifd0.get(TAG_ORIENTATION);
+
+        return {
+          captured_at: toIsoTimestamp(
+            (original && readAscii(view, tiffStart, original, little)) ||
+            (fallback && readAscii(view, tiffStart, fallback, little))
+          ),
+          camera_model: model && readAscii(view, tiffStart, model, little),
+          orientation: orientation?.type === 3 ? view.getUint16(orientation.valueOffset, little) : undefined
+        };
+      }
+
+      offset += 2 + length;
+    }
+  } catch (e) {
+    console.warn('EXIF read failed:', e);
+  }
+  return {};
+}